@@ -1,9 +1,14 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 from collections import namedtuple
 import math
 from docplex.mp.model import Model
+#instances.py at the repository root is shared by all solvers
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from instances import facility_instance, parse_numbers, load_numbers
 
 
 Point = namedtuple("Point", ['x', 'y'])
@@ -58,21 +63,11 @@ def solve_it(input_data):
     # Modify this code to run your optimization algorithm
 
     # parse the input
-    lines = input_data.split('\n')
-
-    parts = lines[0].split()
-    facility_count = int(parts[0])
-    customer_count = int(parts[1])
-    
-    facilities = []
-    for i in range(1, facility_count+1):
-        parts = lines[i].split()
-        facilities.append(Facility(i-1, float(parts[0]), int(parts[1]), Point(float(parts[2]), float(parts[3])) ))
-
-    customers = []
-    for i in range(facility_count+1, facility_count+1+customer_count):
-        parts = lines[i].split()
-        customers.append(Customer(i-1-facility_count, int(parts[0]), Point(float(parts[1]), float(parts[2]))))
+    instance = facility_instance(parse_numbers(input_data))
+    facility_count = instance.facility_count
+    customer_count = instance.customer_count
+    facilities = instance.facilities(Facility, Point)
+    customers = instance.customers(Customer, Point)
 
     #solve it with mip
     obj, opt, solution = facility_solver(facility_count, customer_count, facilities, customers, time_threshold=1800)
@@ -88,8 +83,7 @@ if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1:
         file_location = sys.argv[1].strip()
-        with open(file_location, 'r') as input_data_file:
-            input_data = input_data_file.read()
+        input_data = load_numbers(file_location)
         print(solve_it(input_data))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/fl_16_2)')
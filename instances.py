@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#instance parsing shared by the knapsack, tsp, facility and vrp solvers: all numbers of an
+#instance are read in one numpy pass and sliced into columns, the namedtuple lists the
+#solvers used to build line by line are only created when asked for
+
+import numpy as np
+
+
+def parse_numbers(input_data):
+    #every number of the instance text as one float64 array (exact for integers below 2^53);
+    #an array from load_numbers is passed through, so solve_it takes either
+    if isinstance(input_data, np.ndarray):
+        return input_data
+    return np.fromstring(input_data, sep=' ')
+
+def load_numbers(file_location):
+    #same as parse_numbers, straight from the file without building the text in python
+    return np.fromfile(file_location, sep=' ')
+
+def table(numbers, start, rows, columns):
+    #rows x columns block of numbers starting at index start
+    end = start + rows * columns
+    if len(numbers) < end:
+        raise ValueError('instance has %d numbers, expected at least %d' % (len(numbers), end))
+    return numbers[start:end].reshape(rows, columns)
+
+
+class knapsack_instance():
+    #first line: item_count capacity, then one 'value weight' line per item
+
+    def __init__(self, numbers):
+        self.item_count = int(numbers[0])
+        self.capacity = int(numbers[1])
+        items = table(numbers, 2, self.item_count, 2).astype(np.int64)
+        self.values = np.ascontiguousarray(items[:, 0])
+        self.weights = np.ascontiguousarray(items[:, 1])
+        self._items = None
+
+    def items(self, Item):
+        #[Item(index, value, weight)], built on first use
+        if self._items is None:
+            self._items = [Item(i, value, weight) for i, (value, weight)
+                           in enumerate(zip(self.values.tolist(), self.weights.tolist()))]
+        return self._items
+
+
+class tsp_instance():
+    #first line: node_count, then one 'x y' line per node
+
+    def __init__(self, numbers):
+        self.node_count = int(numbers[0])
+        self.coords = np.ascontiguousarray(table(numbers, 1, self.node_count, 2))
+
+
+class facility_instance():
+    #first line: facility_count customer_count, then 'setup_cost capacity x y' per facility
+    #and 'demand x y' per customer
+
+    def __init__(self, numbers):
+        self.facility_count = int(numbers[0])
+        self.customer_count = int(numbers[1])
+        facilities = table(numbers, 2, self.facility_count, 4)
+        customers = table(numbers, 2 + 4 * self.facility_count, self.customer_count, 3)
+        self.setup_costs = np.ascontiguousarray(facilities[:, 0])
+        self.capacities = facilities[:, 1].astype(np.int64)
+        self.facility_locations = np.ascontiguousarray(facilities[:, 2:])
+        self.demands = customers[:, 0].astype(np.int64)
+        self.customer_locations = np.ascontiguousarray(customers[:, 1:])
+        self._facilities = None
+        self._customers = None
+
+    def facilities(self, Facility, Point):
+        #[Facility(index, setup_cost, capacity, Point(x, y))], built on first use
+        if self._facilities is None:
+            self._facilities = [Facility(i, setup_cost, capacity, Point(x, y)) for i, (setup_cost, capacity, (x, y))
+                                in enumerate(zip(self.setup_costs.tolist(), self.capacities.tolist(),
+                                                 self.facility_locations.tolist()))]
+        return self._facilities
+
+    def customers(self, Customer, Point):
+        #[Customer(index, demand, Point(x, y))], built on first use
+        if self._customers is None:
+            self._customers = [Customer(i, demand, Point(x, y)) for i, (demand, (x, y))
+                               in enumerate(zip(self.demands.tolist(), self.customer_locations.tolist()))]
+        return self._customers
+
+
+class vrp_instance():
+    #first line: customer_count vehicle_count vehicle_capacity, then 'demand x y' per customer,
+    #the depot first
+
+    def __init__(self, numbers):
+        self.customer_count = int(numbers[0])
+        self.vehicle_count = int(numbers[1])
+        self.vehicle_capacity = int(numbers[2])
+        customers = table(numbers, 3, self.customer_count, 3)
+        self.demands = customers[:, 0].astype(np.int64)
+        self.coords = np.ascontiguousarray(customers[:, 1:])
+        self._customers = None
+
+    def customers(self, Customer):
+        #[Customer(index, demand, x, y)], built on first use
+        if self._customers is None:
+            self._customers = [Customer(i, demand, x, y) for i, (demand, (x, y))
+                               in enumerate(zip(self.demands.tolist(), self.coords.tolist()))]
+        return self._customers
@@ -24,12 +24,19 @@ public class Solver {
      */
     public static void solve(String[] args) throws IOException {
         String fileName = null;
+        boolean worker = false;
         
         // get the temp file name
         for(String arg : args){
             if(arg.startsWith("-file=")){
                 fileName = arg.substring(6);
-            } 
+            } else if(arg.equals("-worker")){
+                worker = true;
+            }
+        }
+        if(worker){
+            serve(new BufferedReader(new InputStreamReader(System.in)), System.out);
+            return;
         }
         if(fileName == null)
             return;
@@ -48,7 +55,41 @@ public class Solver {
             input.close();
         }
         
-        
+        System.out.print(solve(lines));
+    }
+
+    /**
+     * Worker mode: solve instances until end of input or an empty message. Every message, in
+     * both directions, is a line with the number of lines that follow and then those lines.
+     */
+    public static void serve(BufferedReader input, PrintStream output) throws IOException {
+        String header = null;
+        while ((header = input.readLine()) != null){
+            int count = Integer.parseInt(header.trim());
+            if(count == 0)
+                break;
+            List<String> lines = new ArrayList<String>();
+            for(int i=0; i < count; i++){
+                String line = input.readLine();
+                if(line == null)
+                    throw new EOFException("instance ended after " + i + " of " + count + " lines");
+                lines.add(line);
+            }
+            String[] solution = solve(lines).split("\n");
+            StringBuilder message = new StringBuilder();
+            message.append(solution.length).append("\n");
+            for(String line : solution){
+                message.append(line).append("\n");
+            }
+            output.print(message);
+            output.flush();
+        }
+    }
+
+    /**
+     * Solve the instance given by the lines of its file, returns the solution in the output format
+     */
+    public static String solve(List<String> lines) {
         // parse the data in the file
         String[] firstLine = lines.get(0).split("\\s+");
         int items = Integer.parseInt(firstLine[0]);
@@ -82,10 +123,12 @@ public class Solver {
         }
         
         // prepare the solution in the specified output format
-        System.out.println(value+" 0");
+        StringBuilder solution = new StringBuilder();
+        solution.append(value+" 0\n");
         for(int i=0; i < items; i++){
-            System.out.print(taken[i]+" ");
+            solution.append(taken[i]+" ");
         }
-        System.out.println("");        
+        solution.append("\n");
+        return solution.toString();
     }
-}
\ No newline at end of file
+}
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from solver import solve_it, TIME_BUDGET
+from instances import load_numbers
+
+
+def read_stream(stream, prefix='stdin'):
+    #instances written one after the other: a 'n capacity' line followed by n item lines;
+    #a malformed or truncated instance is passed on as it is and fails in its own solve_it
+    k = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        lines = [line]
+        count = line.split()[0]
+        for _ in range(int(count) if count.isdigit() else 0):
+            following = next(stream, None)
+            if following is None:
+                break
+            lines.append(following)
+        yield '%s_%d' % (prefix, k), ''.join(lines)
+        k += 1
+
+def read_instances(paths):
+    #(name, input_data) for every file, directories are expanded and '-' reads stdin;
+    #files are loaded straight into number arrays, which solve_it accepts in place of the text
+    for path in paths:
+        if path == '-':
+            yield from read_stream(sys.stdin)
+        elif os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.isfile(os.path.join(path, name)):
+                    yield name, load_numbers(os.path.join(path, name))
+        else:
+            yield os.path.basename(path), load_numbers(path)
+
+def solve_batch(instances, time_budget=None, workers=None):
+    #solves (name, input_data) pairs in a process pool and yields (name, output_data, error) in
+    #completion order; at most 4 instances per worker are read ahead, so streams of any length work
+    workers = workers or os.cpu_count()
+    instances = iter(instances)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        while True:
+            for name, input_data in instances:
+                pending[executor.submit(solve_it, input_data, time_budget)] = name
+                if len(pending) >= 4 * workers:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                if future.exception() is not None:
+                    yield name, None, future.exception()
+                else:
+                    yield name, future.result(), None
+
+def main():
+    parser = argparse.ArgumentParser(description='solve many knapsack instances in parallel')
+    parser.add_argument('inputs', nargs='+', help="instance files or directories, '-' for instances on stdin")
+    parser.add_argument('-o', '--output', help='directory for one solution file per instance (default: stdout)')
+    parser.add_argument('-t', '--time-budget', type=float, default=TIME_BUDGET,
+                        help='wall-clock seconds per instance, every engine stops at it (default: %(default)s)')
+    parser.add_argument('-w', '--workers', type=int, help='worker processes (default: cpu count)')
+    args = parser.parse_args()
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    failed = 0
+    for name, output_data, error in solve_batch(read_instances(args.inputs), args.time_budget, args.workers):
+        if error is not None:
+            failed += 1
+            print('%s: %r' % (name, error), file=sys.stderr)
+        elif args.output:
+            with open(os.path.join(args.output, name), 'w') as output_file:
+                output_file.write(output_data + '\n')
+        else:
+            print(name)
+            print(output_data, flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,35 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import os
+import sys
+from bisect import bisect_right
 from collections import namedtuple
-from docplex.mp.model import Model
+from itertools import accumulate
+from time import time
 import numpy as np
+#instances.py at the repository root is shared by all solvers
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from instances import knapsack_instance, parse_numbers, load_numbers
 
 Item = namedtuple("Item", ['index', 'value', 'weight'])
 
+#engine selection: bit table dp up to DP_CELLS cells (n * capacity) and DP_BYTES of memory,
+#branch and bound up to BNB_ITEMS items, then the pareto dp with at most PARETO_STATES stored
+#states (about 16 bytes each) unless value/weight are nearly proportional, then the mip
+DP_CELLS = 2**28
+DP_BYTES = 2**27
+BNB_ITEMS = 30
+PARETO_STATES = 2*10**6
+CORRELATED_SPREAD = 0.01
 
-def knapsack_mip(num_vars, items, capacity):
+#wall-clock seconds per instance
+TIME_BUDGET = 600
+
+
+def knapsack_mip(num_vars, items, capacity, time_threshold=None):
+    #imported here so that instances solved by the other engines do not pay for docplex
+    from docplex.mp.model import Model
     # create one model instance, with a name
     m = Model(name='knapsack')
     #set up variables
@@ -18,12 +39,23 @@ def knapsack_mip(num_vars, items, capacity):
     #set up constraints
     m.add_constraint(m.sum(m.taken[item]*item.weight for item in items) <= capacity)
     m.maximize(obj)
+    #values are integers, the default relative gap would accept solutions short of the optimum,
+    #and with weights in the millions the default integrality tolerance lets x = 1 - 1e-5 use
+    #capacity that is not there
+    m.parameters.mip.tolerances.mipgap = 0
+    m.parameters.mip.tolerances.integrality = 0
+    if time_threshold:
+        m.set_time_limit(time_threshold)
     m.solve()
-    if m.get_solve_status() != None:
+    if m.solution is None:
+        return 0, 0, [0]*num_vars
+    #a solution left by the time limit is not proven optimal
+    if 'optimal' in m.solve_details.status:
         status = 1
     else:
         status = 0
-    return m.objective_value, status, [int(m.taken[item].solution_value) for item in items]
+    taken = [int(round(m.taken[item].solution_value)) for item in items]
+    return sum(item.value for item, x in zip(items, taken) if x), status, taken
 
 def dynamic_model(num_vars, items, capacity):
     taken = [0]*num_vars
@@ -41,8 +73,8 @@ def dynamic_model(num_vars, items, capacity):
             else:
                 values[i][j] = max(values[i-1][j-weight] + value, values[i-1,j])
     
+    total_weight = capacity
     for i in reversed(range(num_vars)):
-        total_weight = capacity
         if values[i][total_weight] == values[i+1][total_weight]:
             continue
         else:
@@ -50,25 +82,328 @@ def dynamic_model(num_vars, items, capacity):
             total_weight -= items[i].weight
     return values[-1][-1], 1, taken
 
+def dp_model(num_vars, items, capacity, deadline=None):
+    #one int64 row over the capacities updated in place per item with numpy slicing,
+    #the take/skip decision of every (item, capacity) cell is kept as a single bit;
+    #TimeoutError once the time() deadline passes
+    row = np.zeros(capacity+1, dtype=np.int64)
+    decisions = np.zeros((num_vars, capacity//8 + 1), dtype=np.uint8)
+    take = np.zeros(capacity+1, dtype=bool)
+    for i, item in enumerate(items):
+        if deadline and time() > deadline:
+            raise TimeoutError('dp stopped at item %d of %d' % (i, num_vars))
+        if item.weight > capacity:
+            continue
+        candidate = row[:capacity+1-item.weight] + item.value
+        take[:item.weight] = False
+        np.greater(candidate, row[item.weight:], out=take[item.weight:])
+        np.maximum(row[item.weight:], candidate, out=row[item.weight:])
+        decisions[i] = np.packbits(take)
 
+    taken = [0]*num_vars
+    j = capacity
+    for i in reversed(range(num_vars)):
+        if decisions[i, j >> 3] >> (7 - (j & 7)) & 1:
+            taken[i] = 1
+            j -= items[i].weight
+    return int(row[capacity]), 1, taken
 
+def dp_row(items, capacity):
+    #best value of the items for every capacity 0..capacity
+    row = np.zeros(capacity+1, dtype=np.int64)
+    for item in items:
+        if item.weight <= capacity:
+            np.maximum(row[item.weight:], row[:capacity+1-item.weight] + item.value, out=row[item.weight:])
+    return row
 
-def solve_it(input_data):
-    # Modify this code to run your optimization algorithm
+def hirschberg_model(num_vars, items, capacity, max_cells=2**25):
+    #divide and conquer reconstruction: the dp rows of the two halves of the items give how the
+    #capacity is split between them, then each half is solved for its share; only O(capacity)
+    #values are kept, subproblems with at most max_cells cells are finished by dp_model
+    taken = [0]*num_vars
+    stack = [(0, num_vars, capacity)]
+    while stack:
+        lo, hi, cap = stack.pop()
+        if hi - lo <= 1 or (hi - lo) * (cap + 1) <= max_cells:
+            taken[lo:hi] = dp_model(hi - lo, items[lo:hi], cap)[2]
+            continue
+        mid = (lo + hi) // 2
+        left = dp_row(items[lo:mid], cap)
+        right = dp_row(items[mid:hi], cap)
+        split = int((left + right[::-1]).argmax())
+        stack.append((lo, mid, split))
+        stack.append((mid, hi, cap - split))
+    value = sum(item.value for item, x in zip(items, taken) if x)
+    return value, 1, taken
 
-    # parse the input
-    lines = input_data.split('\n')
+def pareto_model(num_vars, items, capacity, max_states=None, deadline=None):
+    #nemhauser-ullmann: only the non-dominated (weight, value) states are kept, as arrays sorted
+    #by weight with strictly increasing values, so time and memory follow the number of such
+    #states instead of capacity; items go in density order and states whose dantzig bound over
+    #the remaining items is below the greedy value are dropped; the frontier after every item
+    #is kept to rebuild the solution; MemoryError once more than max_states states are stored,
+    #TimeoutError once the time() deadline passes
+    order = sorted(range(num_vars), key=lambda i: items[i].value / items[i].weight if items[i].weight else np.inf,
+                   reverse=True)
+    item_weights = np.array([items[i].weight for i in order] + [1], dtype=np.int64)
+    item_values = np.array([items[i].value for i in order] + [0], dtype=np.int64)
+    #prefix sums, the sentinel item after the last one has density 0
+    prefix_w = np.concatenate([[0], np.cumsum(item_weights[:-1])])
+    prefix_v = np.concatenate([[0], np.cumsum(item_values[:-1])])
+    greedy = 0
+    room = capacity
+    for w, v in zip(item_weights[:-1].tolist(), item_values[:-1].tolist()):
+        if w <= room:
+            room -= w
+            greedy += v
 
-    firstLine = lines[0].split()
-    item_count = int(firstLine[0])
-    capacity = int(firstLine[1])
+    weights = np.zeros(1, dtype=np.int64)
+    values = np.zeros(1, dtype=np.int64)
+    frontiers = []
+    stored = 0
+    for k, i in enumerate(order):
+        if deadline and time() > deadline:
+            raise TimeoutError('pareto dp stopped at item %d of %d' % (k, num_vars))
+        item = items[i]
+        frontiers.append((weights, values))
+        fits = weights <= capacity - item.weight
+        all_weights = np.concatenate([weights, weights[fits] + item.weight])
+        all_values = np.concatenate([values, values[fits] + item.value])
+        state_order = np.lexsort((-all_values, all_weights))
+        all_weights, all_values = all_weights[state_order], all_values[state_order]
+        #a state survives when it is worth more than every lighter (or equally heavy, earlier) state
+        best_before = np.maximum.accumulate(all_values)
+        keep = np.empty(len(all_values), dtype=bool)
+        keep[0] = True
+        keep[1:] = all_values[1:] > best_before[:-1]
+        #and when the items after k can still lift it to the greedy value
+        limit = prefix_w[k+1] + capacity - all_weights
+        b = np.minimum(np.searchsorted(prefix_w, limit, side='right') - 1, num_vars)
+        bound = all_values + prefix_v[b] - prefix_v[k+1] + (limit - prefix_w[b]) * item_values[b] / item_weights[b]
+        keep &= bound >= greedy - 1e-6
+        weights, values = all_weights[keep], all_values[keep]
+        stored += len(weights)
+        if max_states and stored > max_states:
+            raise MemoryError('more than %d pareto states' % max_states)
 
-    items = []
+    taken = [0]*num_vars
+    best = int(values.argmax())
+    weight, value = int(weights[best]), int(values[best])
+    for k in reversed(range(num_vars)):
+        previous_weights, previous_values = frontiers[k]
+        j = np.searchsorted(previous_weights, weight)
+        if j < len(previous_weights) and previous_weights[j] == weight and previous_values[j] == value:
+            continue
+        taken[order[k]] = 1
+        weight -= items[order[k]].weight
+        value -= items[order[k]].value
+    return int(values[best]), 1, taken
+
+def branch_and_bound(num_vars, items, capacity, time_threshold=None):
+    #depth-first branch and bound over the items sorted by value density, a node is pruned when
+    #the dantzig bound (greedy fill plus a fraction of the break item, located by bisecting the
+    #prefix sums of the weights) cannot beat the incumbent; opt is 0 if the time ran out
+    t = time()
+    taken = [0]*num_vars
+    #zero weight items are always taken, items heavier than the knapsack never
+    for i, item in enumerate(items):
+        if item.weight == 0:
+            taken[i] = 1
+    order = sorted((i for i, item in enumerate(items) if 0 < item.weight <= capacity),
+                   key=lambda i: items[i].value / items[i].weight, reverse=True)
+    n = len(order)
+    weights = [items[i].weight for i in order]
+    values = [items[i].value for i in order]
+    prefix_w = list(accumulate(weights, initial=0))
+    prefix_v = list(accumulate(values, initial=0))
+
+    def bound(k, room, value):
+        b = bisect_right(prefix_w, prefix_w[k] + room, lo=k) - 1
+        value += prefix_v[b] - prefix_v[k]
+        if b < n:
+            value += (prefix_w[k] + room - prefix_w[b]) * values[b] / weights[b]
+        return value
+
+    #greedy incumbent, chosen items are kept as a linked list (k, previous)
+    best_value, best_chosen = 0, None
+    room = capacity
+    for k in range(n):
+        if weights[k] <= room:
+            room -= weights[k]
+            best_value += values[k]
+            best_chosen = (k, best_chosen)
+
+    opt = 1
+    nodes = 0
+    stack = [(0, capacity, 0, None)]
+    while stack:
+        nodes += 1
+        if time_threshold and nodes % 4096 == 0 and time() - t >= time_threshold:
+            opt = 0
+            break
+        k, room, value, chosen = stack.pop()
+        if value > best_value:
+            best_value, best_chosen = value, chosen
+        #values are integers, so a bound below best_value + 1 cannot lead to a better solution
+        if k == n or bound(k, room, value) < best_value + 1:
+            continue
+        stack.append((k+1, room, value, chosen))
+        if weights[k] <= room:
+            stack.append((k+1, room - weights[k], value + values[k], (k, chosen)))
 
-    for i in range(1, item_count+1):
-        line = lines[i]
-        parts = line.split()
-        items.append(Item(i-1, int(parts[0]), int(parts[1])))
+    while best_chosen:
+        k, best_chosen = best_chosen
+        taken[order[k]] = 1
+    value = sum(item.value for item, x in zip(items, taken) if x)
+    return value, opt, taken
+
+def reduction(num_vars, items, capacity):
+    #fixes items to 0/1 before an exact engine runs, returns (fixed, incumbent) where fixed[i] is
+    #0, 1 or None for the free (core) items and incumbent is the greedy (value, taken)
+    #- reduced cost test: the lp bound with item j forced away from its value in the lp solution
+    #  cannot beat the greedy incumbent, so only solutions no better than the incumbent flip it
+    #- dominance: some optimal solution that takes j also takes every item that dominates j
+    #  (no heavier and no less valuable), so j is out when j and its dominators do not fit
+    fixed = [None]*num_vars
+    weights = np.array([item.weight for item in items], dtype=np.int64)
+    values = np.array([item.value for item in items], dtype=np.int64)
+    for i in np.flatnonzero(weights == 0).tolist():
+        fixed[i] = 1
+    for i in np.flatnonzero(weights > capacity).tolist():
+        fixed[i] = 0
+    candidates = np.flatnonzero((weights > 0) & (weights <= capacity))
+    order = candidates[np.argsort(-values[candidates] / weights[candidates], kind='stable')]
+    w, v = weights[order], values[order]
+    m = len(order)
+    prefix_w = np.concatenate([[0], np.cumsum(w)])
+    prefix_v = np.concatenate([[0], np.cumsum(v)])
+    #the first b items fit, item b is the break item
+    b = int(np.searchsorted(prefix_w, capacity, side='right')) - 1
+
+    taken = [1 if x == 1 else 0 for x in fixed]
+    room = capacity
+    for k, i in enumerate(order.tolist()):
+        if w[k] <= room:
+            room -= int(w[k])
+            taken[i] = 1
+    incumbent = sum(item.value for item, x in zip(items, taken) if x)
+    if b == m:
+        for i in order.tolist():
+            fixed[i] = 1
+        return fixed, (incumbent, taken)
+
+    def lp_bound(room):
+        #dantzig bound of the candidates for an array of capacities
+        k = np.searchsorted(prefix_w, room, side='right') - 1
+        fraction = np.where(k < m, (room - prefix_w[k]) * v[np.minimum(k, m-1)] / w[np.minimum(k, m-1)], 0.0)
+        return prefix_v[k] + fraction
+
+    #items before the break item forced out, items after it forced in
+    bound = np.empty(m)
+    #(an item before the break item taken out frees its weight for the items after it)
+    bound[:b] = lp_bound(capacity + w[:b]) - v[:b]
+    bound[b+1:] = lp_bound(capacity - w[b+1:]) + v[b+1:]
+    bound[b] = np.inf
+    #integer values: a bound below incumbent + 1 cannot lead to a better solution
+    #(the zero weight items are in every solution but not in the bound)
+    bound += int(values[weights == 0].sum())
+    for k in np.flatnonzero(bound < incumbent + 1 - 1e-6).tolist():
+        fixed[int(order[k])] = 1 if k < b else 0
+
+    #dominance over the candidates in (weight, -value, index) order, where every item dominated
+    #by j comes after j; a fenwick tree over value ranks sums the weight of the dominators
+    by_weight = candidates[np.lexsort((candidates, -values[candidates], weights[candidates]))]
+    levels = np.unique(values[candidates])
+    ranks = (len(levels) - np.searchsorted(levels, values, side='left')).tolist()
+    tree = [0]*(len(levels) + 1)
+    for j in by_weight.tolist():
+        weight = 0
+        r = ranks[j]
+        while r > 0:
+            weight += tree[r]
+            r -= r & -r
+        if fixed[j] is None and weight + items[j].weight > capacity:
+            fixed[j] = 0
+        r = ranks[j]
+        while r < len(tree):
+            tree[r] += items[j].weight
+            r += r & -r
+    return fixed, (incumbent, taken)
+
+def solve_reduced(engine, num_vars, items, capacity):
+    #engine(num_vars, items, capacity) only sees the core items left free by the reduction
+    fixed, (incumbent, incumbent_taken) = reduction(num_vars, items, capacity)
+    core = [i for i in range(num_vars) if fixed[i] is None]
+    taken = [x or 0 for x in fixed]
+    opt = 1
+    if core:
+        room = capacity - sum(items[i].weight for i in range(num_vars) if fixed[i] == 1)
+        core_items = [Item(k, items[i].value, items[i].weight) for k, i in enumerate(core)]
+        _, opt, core_taken = engine(len(core), core_items, room)
+        for i, x in zip(core, core_taken):
+            taken[i] = x
+    value = sum(item.value for item, x in zip(items, taken) if x)
+    if incumbent > value:
+        return incumbent, opt, incumbent_taken
+    return value, opt, taken
+
+
+
+
+def dp_bytes(num_vars, capacity):
+    #dp_model's value row and its candidate/take temporaries (17 bytes per capacity) plus the bit table
+    return 17 * (capacity + 1) + num_vars * (capacity // 8 + 1)
+
+def select_engine(num_vars, items, capacity):
+    #'dp', 'bnb', 'pareto' or 'mip' from the table size, the item count and the spread of the
+    #value densities; when the densities are nearly equal (strongly correlated items) the pareto
+    #frontier blows up
+    if num_vars * (capacity + 1) <= DP_CELLS and dp_bytes(num_vars, capacity) <= DP_BYTES:
+        return 'dp'
+    if num_vars <= BNB_ITEMS:
+        return 'bnb'
+    densities = np.array([item.value / item.weight for item in items if item.weight > 0])
+    if len(densities) and densities.std() > CORRELATED_SPREAD * densities.mean():
+        return 'pareto'
+    return 'mip'
+
+def auto_model(num_vars, items, capacity, deadline=None):
+    #the selected engine within the time() deadline; the mip takes over when the pareto frontier
+    #outgrows PARETO_STATES, and branch and bound (which returns at least the greedy solution)
+    #when docplex is not installed, cplex fails (e.g. the community edition size limits) or an
+    #engine runs out of time
+    remaining = lambda: None if deadline is None else max(deadline - time(), 1e-3)
+    engine = select_engine(num_vars, items, capacity)
+    try:
+        if engine == 'dp':
+            return dp_model(num_vars, items, capacity, deadline=deadline)
+        if engine == 'pareto':
+            try:
+                return pareto_model(num_vars, items, capacity, max_states=PARETO_STATES, deadline=deadline)
+            except MemoryError:
+                pass
+        if engine != 'bnb':
+            try:
+                from docplex.mp.utils import DOcplexException
+                try:
+                    return knapsack_mip(num_vars, items, capacity, time_threshold=remaining())
+                except DOcplexException:
+                    pass
+            except ImportError:
+                pass
+    except TimeoutError:
+        pass
+    return branch_and_bound(num_vars, items, capacity, time_threshold=remaining())
+
+
+def solve_it(input_data, time_threshold=TIME_BUDGET):
+    # Modify this code to run your optimization algorithm
+
+    # parse the input
+    instance = knapsack_instance(parse_numbers(input_data))
+    item_count = instance.item_count
+    capacity = instance.capacity
+    items = instance.items(Item)
 
     # # a trivial algorithm for filling the knapsack
     # # it takes items in-order until the knapsack is full
@@ -82,8 +417,16 @@ def solve_it(input_data):
     #         value += item.value
     #         weight += item.weight
     
-    value, opt, taken = knapsack_mip(item_count, items, capacity)
+    #every engine stops at the deadline, time_threshold=None lets them run to the end
+    deadline = time() + time_threshold if time_threshold else None
+    engine = lambda num_vars, items, capacity: auto_model(num_vars, items, capacity, deadline)
+    value, opt, taken = solve_reduced(engine, item_count, items, capacity)
+    # value, opt, taken = solve_reduced(knapsack_mip, item_count, items, capacity)
     # value, opt, taken = dynamic_model(item_count, items, capacity)
+    # value, opt, taken = dp_model(item_count, items, capacity)
+    # value, opt, taken = hirschberg_model(item_count, items, capacity)
+    # value, opt, taken = pareto_model(item_count, items, capacity)
+    # value, opt, taken = branch_and_bound(item_count, items, capacity, time_threshold=60)
 
     # prepare the solution in the specified output format
     output_data = str(value) + ' ' + str(opt) + '\n'
@@ -95,9 +438,9 @@ if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1:
         file_location = sys.argv[1].strip()
-        with open(file_location, 'r') as input_data_file:
-            input_data = input_data_file.read()
-        print(solve_it(input_data))
+        input_data = load_numbers(file_location)
+        time_threshold = float(sys.argv[2]) if len(sys.argv) > 2 else TIME_BUDGET
+        print(solve_it(input_data, time_threshold=time_threshold))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/ks_4_0)')
 
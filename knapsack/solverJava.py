@@ -2,36 +2,78 @@
 # -*- coding: utf-8 -*-
 
 import os
+import tempfile
 from subprocess import Popen, PIPE
 
 def solve_it(input_data):
 
-    # Writes the inputData to a temporay file
+    # Writes the inputData to a temporay file, unique so that concurrent runs do not clash
 
-    tmp_file_name = 'tmp.data'
-    tmp_file = open(tmp_file_name, 'w')
-    tmp_file.write(input_data)
-    tmp_file.close()
+    tmp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.data', delete=False)
+    tmp_file_name = tmp_file.name
+    try:
+        tmp_file.write(input_data)
+        tmp_file.close()
 
-    # Runs the command: java Solver -file=tmp.data
+        # Runs the command: java Solver -file=tmp.data
 
-    process = Popen(['java', 'Solver', '-file=' + tmp_file_name], stdout=PIPE, universal_newlines=True)
-    (stdout, stderr) = process.communicate()
-
-    # removes the temporay file
-    os.remove(tmp_file_name)
+        process = Popen(['java', 'Solver', '-file=' + tmp_file_name], stdout=PIPE, universal_newlines=True)
+        (stdout, stderr) = process.communicate()
+    finally:
+        # removes the temporay file
+        os.remove(tmp_file_name)
 
     return stdout.strip()
 
 
+class JavaWorker():
+    #one long-lived 'java Solver -worker' process that solves instances sent over its stdin, so
+    #a batch pays the jvm start-up once; every message in both directions is a line with the
+    #number of lines that follow and then those lines
+
+    def __init__(self, command=('java', 'Solver', '-worker')):
+        self.process = Popen(list(command), stdin=PIPE, stdout=PIPE, universal_newlines=True)
+
+    def solve_it(self, input_data):
+        lines = input_data.rstrip('\n').split('\n')
+        self.process.stdin.write('%d\n%s\n' % (len(lines), '\n'.join(lines)))
+        self.process.stdin.flush()
+        header = self.process.stdout.readline()
+        if not header:
+            raise RuntimeError('java worker exited with code %s' % self.process.poll())
+        return ''.join(self.process.stdout.readline() for _ in range(int(header))).strip()
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write('0\n')
+                self.process.stdin.close()
+            except OSError:
+                pass
+            self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 import sys
 
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 2:
+        #several instances share one jvm
+        with JavaWorker() as worker:
+            for file_location in sys.argv[1:]:
+                with open(file_location.strip(), 'r') as input_data_file:
+                    input_data = input_data_file.read()
+                print(file_location.strip())
+                print(worker.solve_it(input_data))
+    elif len(sys.argv) > 1:
         file_location = sys.argv[1].strip()
         with open(file_location, 'r') as input_data_file:
             input_data = input_data_file.read()
         print(solve_it(input_data))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/ks_4_0)')
-
@@ -0,0 +1,87 @@
+import random
+import signal
+import threading
+from time import time
+from tsp_solver import tsp_solver
+from distance import distance_provider
+
+
+class anytime_driver():
+    #spends a wall-clock budget on construction -> local search -> perturbation phases and
+    #keeps the best tour found so far; ctrl-c (SIGINT) stops the running phase and run()
+    #returns the incumbent right away
+
+    def __init__(self, points, time_budget, dist=None, local_search='lk', construction='greedy_edge', seed=None):
+        self.points = points
+        self.time_budget = time_budget
+        self.dist = dist if dist is not None else distance_provider(points)
+        self.local_search = local_search
+        self.construction = construction
+        self.random = random.Random(seed)
+        self.solver = tsp_solver(solution=None, points=points, dist=self.dist)
+        self.best_obj = None
+        self.best_tour = None
+        self.interrupted = False
+
+    def remaining(self):
+        return self.deadline - time()
+
+    def expired(self):
+        return self.interrupted or self.remaining() <= 0
+
+    def interrupt(self, signum=None, frame=None):
+        self.interrupted = True
+        self.solver.stop = True
+
+    def update(self, obj, tour):
+        if self.best_obj is None or obj < self.best_obj - self.solver.threshold:
+            self.best_obj = obj
+            self.best_tour = list(tour)
+            return True
+        return False
+
+    def construct(self):
+        #'greedy' (nearest neighbor), 'space_filling_curve' (hilbert order) or 'greedy_edge'
+        if self.construction == 'greedy':
+            return self.solver.greedy()
+        if self.construction == 'space_filling_curve':
+            return self.solver.space_filling_curve()
+        return self.solver.greedy_edge()
+
+    def improve(self):
+        #local search on the solver's current cycle within the remaining time:
+        #'two_opt', 'two_opt_numpy', 'or_opt' or 'lk'
+        time_threshold = max(self.remaining(), 1e-3)
+        if self.local_search == 'two_opt':
+            return self.solver.two_opt_neighbor_solver(k=10, time_threshold=time_threshold)
+        if self.local_search == 'two_opt_numpy':
+            return self.solver.two_opt_numpy_solver(time_threshold=time_threshold)
+        if self.local_search == 'or_opt':
+            return self.solver.or_opt_solver(k=10, time_threshold=time_threshold)
+        return self.solver.lk_solver(k=8, time_threshold=time_threshold)
+
+    def perturb(self):
+        #iterated local search with double-bridge kicks from the solver's current tour
+        return self.solver.ils_solver(k=8, time_threshold=max(self.remaining(), 1e-3), seed=self.random.random())
+
+    def run(self):
+        self.deadline = time() + self.time_budget
+        handle_signal = threading.current_thread() is threading.main_thread()
+        if handle_signal:
+            previous_handler = signal.signal(signal.SIGINT, self.interrupt)
+        try:
+            #construction
+            obj, _, tour = self.construct()
+            self.update(obj, tour)
+            #local search
+            if not self.expired():
+                obj, _, tour = self.improve()
+                self.update(obj, tour)
+            #perturbation until the budget is spent
+            if not self.expired():
+                obj, _, tour = self.perturb()
+                self.update(obj, tour)
+        finally:
+            if handle_signal:
+                signal.signal(signal.SIGINT, previous_handler)
+        return self.best_obj, 0, self.best_tour
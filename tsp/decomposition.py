@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+import numpy as np
+from tsp_solver import tsp_solver
+from distance import distance_provider
+from spatial import kmeans
+
+
+def solve_cluster(coords, time_budget, seed):
+    #greedy edge + iterated local search on one cluster, returns the tour in local indices
+    solver = tsp_solver(solution=None, points=coords)
+    solver.greedy_edge()
+    return solver.ils_solver(time_threshold=max(time_budget, 1e-3), seed=seed)[2]
+
+def cluster_order(centroids):
+    #visiting order of the clusters: a tour over their centroids
+    if len(centroids) <= 3:
+        return list(range(len(centroids)))
+    solver = tsp_solver(solution=None, points=centroids)
+    solver.greedy_edge()
+    return solver.lk_solver()[2]
+
+def stitch(dist, tours, order, centroids):
+    #open every cluster cycle next to the previous exit and close it towards the next cluster
+    path = []
+    exit_node = None
+    for position, c in enumerate(order):
+        cycle = np.array(tours[c])
+        m = len(cycle)
+        if exit_node is None:
+            entry = 0
+        else:
+            entry = int(((dist.xs[cycle] - dist.xs[exit_node])**2 + (dist.ys[cycle] - dist.ys[exit_node])**2).argmin())
+        #leave the cluster through the tour neighbor of the entry that lies closer to the next cluster
+        x, y = centroids[order[(position + 1) % len(order)]]
+        succ, pred = cycle[(entry + 1) % m], cycle[entry - 1]
+        if (dist.xs[succ] - x)**2 + (dist.ys[succ] - y)**2 < (dist.xs[pred] - x)**2 + (dist.ys[pred] - y)**2:
+            segment = np.roll(cycle[::-1], entry + 1)
+        else:
+            segment = np.roll(cycle, -entry)
+        path.extend(segment.tolist())
+        exit_node = path[-1]
+    return path
+
+def decomposition_tsp(points, time_budget, cluster_size=2000, workers=None, dist=None, k=8, seed=0, cluster_share=0.6):
+    #k-means partition, clusters solved in parallel processes with cluster_share of the budget,
+    #cluster tours stitched in the order of a tour over the centroids, then lk repair started
+    #only from the nodes that have candidate neighbors in another cluster and the stitch points
+    t = time()
+    workers = workers or os.cpu_count()
+    if dist is None:
+        dist = distance_provider(points)
+    n = len(points)
+    labels = kmeans(dist.xs, dist.ys, max(1, n // cluster_size))
+    clusters = [members for members in (np.flatnonzero(labels == c) for c in range(labels.max() + 1)) if len(members)]
+    centroids = np.array([(dist.xs[members].mean(), dist.ys[members].mean()) for members in clusters])
+
+    #each worker handles len(clusters) / workers clusters one after the other
+    rounds = -(-len(clusters) // workers)
+    cluster_budget = time_budget * cluster_share / rounds
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(solve_cluster, np.column_stack([dist.xs[members], dist.ys[members]]),
+                                   cluster_budget, seed + c) for c, members in enumerate(clusters)]
+        tours = [members[future.result()].tolist() for members, future in zip(clusters, futures)]
+
+    path = stitch(dist, tours, cluster_order(centroids), centroids)
+    solver = tsp_solver(solution=None, points=points, dist=dist)
+    solver.set_cycle(path)
+    #boundary repair
+    neighbors = np.array(dist.neighbor_lists(k))
+    boundary = set(np.flatnonzero((labels[neighbors] != labels[:, None]).any(axis=1)).tolist())
+    for i in range(len(path)):
+        if labels[path[i]] != labels[path[i-1]]:
+            boundary.update((path[i], path[i-1]))
+    remaining = max(time_budget - (time() - t), 1e-3)
+    return solver.lk_solver(k=k, time_threshold=remaining, active=list(boundary))
@@ -0,0 +1,85 @@
+import math
+from functools import lru_cache
+import numpy as np
+from spatial import grid_index
+
+
+class distance_provider():
+    #euclidean distances between the points of one instance
+    #up to max_matrix_nodes the full float64 matrix is built once with numpy broadcasting,
+    #above that rows are computed on demand and kept in an lru cache of about cache_mb megabytes
+
+    #points is a list of Point or an (n, 2) array; a prebuilt matrix (e.g. in shared memory) can be passed in
+
+    def __init__(self, points, max_matrix_nodes=4000, cache_mb=64, matrix=None):
+        self.n = len(points)
+        if isinstance(points, np.ndarray):
+            self.xs = np.array(points[:, 0], dtype=np.float64)
+            self.ys = np.array(points[:, 1], dtype=np.float64)
+        else:
+            self.xs = np.array([p.x for p in points], dtype=np.float64)
+            self.ys = np.array([p.y for p in points], dtype=np.float64)
+        #plain lists are faster than numpy indexing for scalar lookups from python loops
+        self.x = self.xs.tolist()
+        self.y = self.ys.tolist()
+        self.matrix = matrix
+        self.neighbors = None
+        if matrix is None and self.n <= max_matrix_nodes:
+            self.matrix = self.rows(0, self.n)
+        if self.matrix is not None:
+            self.row = self.matrix.__getitem__
+        else:
+            cache_rows = max(1, cache_mb * 2**20 // (8 * self.n))
+            self.row = lru_cache(maxsize=cache_rows)(self.compute_row)
+
+    def __call__(self, i, j):
+        dx = self.x[i] - self.x[j]
+        dy = self.y[i] - self.y[j]
+        return math.sqrt(dx*dx + dy*dy)
+
+    def compute_row(self, i):
+        return np.sqrt((self.xs - self.xs[i])**2 + (self.ys - self.ys[i])**2)
+
+    def rows(self, start, end):
+        #distances from nodes start..end-1 to every node
+        if self.matrix is not None:
+            return self.matrix[start:end]
+        return np.sqrt((self.xs[start:end, None] - self.xs[None, :])**2 +
+                       (self.ys[start:end, None] - self.ys[None, :])**2)
+
+    def lengths(self, a, b):
+        #element-wise distances between node arrays a and b
+        return np.sqrt((self.xs[a] - self.xs[b])**2 + (self.ys[a] - self.ys[b])**2)
+
+    def tour_length(self, cycle):
+        #length of a closed node sequence (first node repeated at the end)
+        cycle = np.asarray(cycle)
+        return float(self.lengths(cycle[:-1], cycle[1:]).sum())
+
+    def order_length(self, order):
+        #length of the cycle visiting the nodes of order and returning to the first one
+        order = np.asarray(order)
+        return float(self.lengths(order, np.roll(order, -1)).sum())
+
+    def neighbor_lists(self, k=10):
+        #k nearest neighbors of every node sorted by distance; the longest lists computed so far
+        #are cached and shorter requests get their prefixes
+        k = min(k, self.n - 1)
+        if self.neighbors is not None and len(self.neighbors[0]) >= k:
+            if len(self.neighbors[0]) == k:
+                return self.neighbors
+            return [row[:k] for row in self.neighbors]
+        if self.matrix is None:
+            self.neighbors = grid_index(self.xs, self.ys, points_per_cell=max(2, k)).k_nearest_lists(k)
+            return self.neighbors
+        chunk = max(1, 4000000 // self.n)
+        neighbors = []
+        for start in range(0, self.n, chunk):
+            end = min(start + chunk, self.n)
+            d = self.rows(start, end).copy()
+            d[np.arange(end - start), np.arange(start, end)] = np.inf
+            idx = np.argpartition(d, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(d, idx, axis=1), axis=1)
+            neighbors.extend(np.take_along_axis(idx, order, axis=1).tolist())
+        self.neighbors = neighbors
+        return neighbors
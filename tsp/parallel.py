@@ -0,0 +1,104 @@
+import os
+import queue
+import random
+import signal
+import traceback
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+from time import time
+import numpy as np
+from tsp_solver import tsp_solver
+from distance import distance_provider
+
+
+def to_shared(array):
+    #copy a numpy array into a new shared memory block
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm
+
+def search_worker(shared, deadline, seed, k, results):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    blocks = {name: (SharedMemory(name=shm_name), shape, dtype) for name, (shm_name, shape, dtype) in shared.items()}
+    arrays = {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf) for name, (shm, shape, dtype) in blocks.items()}
+    try:
+        search(arrays, deadline, seed, k, results)
+    except Exception:
+        #the coordinator only sees the queue, so the failure goes there instead of the stderr
+        results.put((None, traceback.format_exc()))
+    finally:
+        #views into the blocks have to go before the blocks can be closed
+        del arrays
+        for shm, _, _ in blocks.values():
+            shm.close()
+
+def search(arrays, deadline, seed, k, results, report_interval=1.0):
+    #randomized nearest neighbor construction + iterated local search on the shared instance,
+    #improvements are sent to the coordinator at most every report_interval seconds
+    coords = arrays['coords']
+    dist = distance_provider(coords, matrix=arrays.get('matrix'))
+    dist.neighbors = arrays['neighbors'].tolist()
+    solver = tsp_solver(solution=None, points=coords, dist=dist)
+    rng = random.Random(seed)
+    obj, _, tour = solver.greedy(start=rng.randrange(len(coords)))
+    results.put((obj, tour))
+    last_report = [time()]
+
+    def report(obj_val, tour):
+        if time() - last_report[0] >= report_interval:
+            results.put((obj_val, tour.to_list(0)))
+            last_report[0] = time()
+
+    obj, _, tour = solver.ils_solver(k=k, time_threshold=max(deadline - time(), 1e-3), seed=seed, report=report)
+    results.put((obj, tour))
+
+def parallel_tsp(points, time_budget, workers=None, dist=None, k=8, seed=0, grace=30):
+    #independent randomized searches in worker processes that share coordinates, candidate lists
+    #and (for small instances) the distance matrix through shared memory; the coordinator keeps
+    #the best reported tour and returns it when the budget expires or on ctrl-c; without any
+    #reported tour it re-raises a worker failure, or falls back to a local greedy_edge tour
+    workers = workers or os.cpu_count()
+    deadline = time() + time_budget
+    if dist is None:
+        dist = distance_provider(points)
+    arrays = {
+        'coords': np.column_stack([dist.xs, dist.ys]),
+        'neighbors': np.array(dist.neighbor_lists(k), dtype=np.int32),
+    }
+    if dist.matrix is not None:
+        arrays['matrix'] = dist.matrix
+    blocks = {name: to_shared(array) for name, array in arrays.items()}
+    shared = {name: (blocks[name].name, array.shape, array.dtype) for name, array in arrays.items()}
+    results = mp.Queue()
+    processes = [mp.Process(target=search_worker, args=(shared, deadline, seed + i, k, results), daemon=True)
+                 for i in range(workers)]
+    best_obj, best_tour, error = None, None, None
+    try:
+        for process in processes:
+            process.start()
+        while time() < deadline + grace:
+            try:
+                obj, tour = results.get(timeout=0.1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break
+                continue
+            if obj is None:
+                error = error or tour
+            elif best_obj is None or obj < best_obj:
+                best_obj, best_tour = obj, tour
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+    if best_tour is None:
+        if error:
+            raise RuntimeError('tsp search worker failed:\n' + error)
+        return tsp_solver(solution=None, points=points, dist=dist).greedy_edge()
+    return best_obj, 0, best_tour
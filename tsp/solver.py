@@ -1,18 +1,27 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import math
-from collections import namedtuple
+import os
+import signal
+import sys
+import threading
+from time import time
 from docplex.mp.model import Model
+from docplex.mp.solution import SolveSolution
+from docplex.mp.utils import DOcplexException
+#instances.py at the repository root is shared by all solvers
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from instances import tsp_instance, parse_numbers, load_numbers
 from tsp_solver import *
+from anytime import anytime_driver
+from parallel import parallel_tsp
+from decomposition import decomposition_tsp
 
-Point = namedtuple("Point", ['x', 'y'])
-
-def length(point1, point2):
-    return math.sqrt((point1.x - point2.x)**2 + (point1.y - point2.y)**2)
 
-def mip_tsp(points, time_threshold=None):
+def mip_tsp(points, time_threshold=None, dist=None, initial_tour=None):
     nodeCount = len(points)
+    if dist is None:
+        dist = distance_provider(points)
     #set up the model
     m = Model(name='tsp')
     #add xij variable
@@ -36,17 +45,27 @@ def mip_tsp(points, time_threshold=None):
             m.add_constraint(m.mu[i] - m.mu[j] + nodeCount*m.x[i,j] <= nodeCount - 1, 'subtour')
     
     #add obj function: sum_xij*c_ij
-    obj = m.sum(length(points[i], points[j])*m.x[i,j] for i in range(nodeCount) for j in range(nodeCount))    
+    obj = m.sum(dist(i, j)*m.x[i,j] for i in range(nodeCount) for j in range(nodeCount) if i != j)
     #set time limit(seconds) for each soltuion
     m.set_time_limit(time_threshold)
     m.minimize(obj)
-    m.solve()
+    if initial_tour:
+        #warm start from the heuristic tour, nothing worse than it is explored
+        initial_obj = dist.tour_length(initial_tour + [initial_tour[0]])
+        m.add_mip_start(SolveSolution(m, {m.x[i,j]: 1 for i, j in zip(initial_tour, initial_tour[1:] + initial_tour[:1])}))
+        m.parameters.mip.tolerances.uppercutoff = initial_obj + cutoff_tolerance(initial_obj)
+    if m.solve() is None:
+        if initial_tour:
+            return initial_obj, 0, initial_tour
+        return None, 0, []
     # print('--------------status---------------------------------- \n', m.get_solve_status())
 
     if 'optimal' in m.solve_details.status:
         status = 1
     else:
         status = 0
+    if initial_tour and m.objective_value >= initial_obj:
+        return initial_obj, status, initial_tour
     # m.export_as_lp('/Users/zhiweifeng/Documents/git/Engines/discrete_optimization/tsp')
     sol = []
     i = 0
@@ -59,39 +78,197 @@ def mip_tsp(points, time_threshold=None):
                 break
     return m.objective_value, status, sol
 
-def solve_it(input_data):
-    # Modify this code to run your optimization algorithm
+def cutoff_tolerance(obj):
+    #slack above a known tour length so that the tour itself survives the cutoff
+    return 1e-6 * max(1.0, abs(obj))
 
-    # parse the input
-    lines = input_data.split('\n')
+def tour_edges(tour):
+    return [(min(i, j), max(i, j)) for i, j in zip(tour, tour[1:] + tour[:1])]
 
-    nodeCount = int(lines[0])
-
-    points = []
-    for i in range(1, nodeCount+1):
-        line = lines[i]
-        parts = line.split()
-        points.append(Point(float(parts[0]), float(parts[1])))
+def subtours(nodeCount, edges):
+    #connected components of the graph given by the selected edges
+    adjacent = [[] for _ in range(nodeCount)]
+    for i, j in edges:
+        adjacent[i].append(j)
+        adjacent[j].append(i)
+    component = [-1]*nodeCount
+    components = []
+    for start in range(nodeCount):
+        if component[start] >= 0:
+            continue
+        component[start] = len(components)
+        nodes = [start]
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            for j in adjacent[i]:
+                if component[j] < 0:
+                    component[j] = component[start]
+                    nodes.append(j)
+                    stack.append(j)
+        components.append(nodes)
+    return components, component
 
+def edges_to_tour(nodeCount, edges):
+    adjacent = [[] for _ in range(nodeCount)]
+    for i, j in edges:
+        adjacent[i].append(j)
+        adjacent[j].append(i)
+    sol = [0]
+    prev = None
+    while len(sol) < nodeCount:
+        i = sol[-1]
+        j = adjacent[i][0] if adjacent[i][0] != prev else adjacent[i][1]
+        prev = i
+        sol.append(j)
+    return sol
 
-    opt = 0
-    solution = []
-    if len(points) <= 200:
-        # solve it with mix integer programming
+def candidate_edges(dist, k, initial_tour=None):
+    #edges of the symmetric k-nearest neighbor graph, plus the edges of initial_tour
+    edges = set()
+    for i, neighbors in enumerate(dist.neighbor_lists(k)):
+        for j in neighbors[:k]:
+            edges.add((min(i, j), max(i, j)))
+    if initial_tour:
+        edges.update(tour_edges(initial_tour))
+    return sorted(edges)
 
-        obj, opt, solution = mip_tsp(points, time_threshold=1200)
-    
-    if opt == 0:
-        
-        solver = tsp_solver(solution=solution, points=points)
-
-        if len(points) < 1500:
-            #solve it with 2-opt
-            #time limit for the algorithm to stop
-            obj, opt, solution = solver.two_opt_solver(time_threshold=1200)
+def mip_tsp_lazy(points, time_threshold=None, dist=None, initial_tour=None, candidate_k=None, stop=None):
+    #symmetric formulation with degree constraints only, subtour elimination cuts
+    #are added lazily for the components of each solution and the model re-solved
+    #initial_tour (e.g. from greedy + local search) is used as mip start and its length as cutoff,
+    #it is returned whenever the mip does not find anything better in time
+    #with candidate_k only the edges of the k-nearest neighbor graph get variables; if that
+    #graph has no tour, k is doubled until it does (or the graph is complete)
+    #stop() returning True, or cplex aborting a solve on ctrl-c, ends the cut loop with initial_tour
+    nodeCount = len(points)
+    if dist is None:
+        dist = distance_provider(points)
+    if nodeCount <= 3:
+        sol = list(range(nodeCount))
+        return dist.tour_length(sol + [0]), 1, sol
+    t = time()
+    if initial_tour:
+        initial_obj = dist.tour_length(initial_tour + [initial_tour[0]])
+        fallback = initial_obj, 0, initial_tour
+    else:
+        fallback = None, 0, []
+    while True:
+        if candidate_k and candidate_k < nodeCount - 1:
+            edges = candidate_edges(dist, candidate_k, initial_tour)
         else:
-             obj, opt, solution = solver.greedy()
-           
+            candidate_k = None
+            edges = [(i, j) for i in range(nodeCount) for j in range(i+1, nodeCount)]
+        m = Model(name='tsp_lazy')
+        m.x = m.binary_var_dict(edges, name='x')
+        incident = [[] for _ in range(nodeCount)]
+        for i, j in edges:
+            incident[i].append(m.x[i,j])
+            incident[j].append(m.x[i,j])
+
+        #every node has degree 2
+        for i in range(nodeCount):
+            m.add_constraint(m.sum(incident[i]) == 2, 'degree_'+str(i))
+
+        m.minimize(m.sum(dist(i, j)*m.x[i,j] for i, j in edges))
+        if initial_tour:
+            m.add_mip_start(SolveSolution(m, {m.x[e]: 1 for e in tour_edges(initial_tour)}))
+            m.parameters.mip.tolerances.uppercutoff = initial_obj + cutoff_tolerance(initial_obj)
+        cuts = 0
+        while True:
+            if stop and stop():
+                return fallback
+            if time_threshold:
+                remaining = time_threshold - (time() - t)
+                if remaining <= 0:
+                    return fallback
+                m.set_time_limit(remaining)
+            solved = m.solve()
+            if (stop and stop()) or 'abort' in m.solve_details.status:
+                return fallback
+            if solved is None:
+                break
+            selected = [e for e in edges if m.x[e].solution_value > 0.5]
+            components, component = subtours(nodeCount, selected)
+            if len(components) == 1:
+                break
+            #sum of x over the edges inside S <= |S| - 1 for every component S
+            inside = [[] for _ in components]
+            for i, j in edges:
+                if component[i] == component[j]:
+                    inside[component[i]].append(m.x[i,j])
+            for c, nodes in enumerate(components):
+                m.add_constraint(m.sum(inside[c]) <= len(nodes) - 1, 'subtour_'+str(cuts))
+                cuts += 1
+        if m.solution is not None or initial_tour or not candidate_k or \
+                'infeasible' not in m.solve_details.status:
+            break
+        #the sparse graph has no hamiltonian cycle, retry with more candidate edges
+        candidate_k *= 2
+
+    if m.solution is None:
+        return fallback
+    #a tour that is optimal on the sparse graph is not proven optimal
+    if 'optimal' in m.solve_details.status and not candidate_k:
+        status = 1
+    else:
+        status = 0
+    if initial_tour and m.objective_value >= initial_obj:
+        return initial_obj, status, initial_tour
+    return m.objective_value, status, edges_to_tour(nodeCount, selected)
+
+#wall-clock seconds per instance
+TIME_BUDGET = 1200
+
+def solve_it(input_data, local_search='lk', time_budget=TIME_BUDGET, workers=1, decompose=False):
+    # Modify this code to run your optimization algorithm
+
+    # parse the input
+    #the (n, 2) coordinate array; every solver here accepts it in place of a list of points
+    points = tsp_instance(parse_numbers(input_data)).coords
+
+
+    t = time()
+    dist = distance_provider(points)
+    mip = len(points) <= 600
+    if decompose and not mip:
+        #k-means clusters solved in parallel, stitched and repaired along the cluster borders
+        obj, opt, solution = decomposition_tsp(points, time_budget, workers=workers, dist=dist)
+        mip = False
+    elif workers > 1 and not mip:
+        #independent searches in worker processes, best tour when the budget expires
+        obj, opt, solution = parallel_tsp(points, time_budget, workers=workers, dist=dist)
+        mip = False
+    else:
+        #construction, local search and perturbation get the whole budget, or a tenth of it
+        #when the mip runs afterwards; ctrl-c returns the best tour found so far
+        driver = anytime_driver(points, time_budget*0.1 if mip else time_budget, dist=dist, local_search=local_search)
+        obj, opt, solution = driver.run()
+        mip = mip and not driver.interrupted
+    remaining = time_budget - (time() - t)
+
+    if mip and remaining > 0:
+        #ctrl-c during the mip keeps the driver's tour, outside of cplex it only sets a flag the
+        #cut loop checks, inside a solve cplex aborts it; so does a cplex failure (e.g. the size
+        #limits of the community edition)
+        interrupted = []
+        handle_signal = threading.current_thread() is threading.main_thread()
+        if handle_signal:
+            previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: interrupted.append(signum))
+        try:
+            if len(points) <= 200:
+                # solve it with mix integer programming, warm started from the heuristic tour
+                obj, opt, solution = mip_tsp_lazy(points, time_threshold=remaining, dist=dist, initial_tour=solution,
+                                                  stop=lambda: bool(interrupted))
+            else:
+                # mip over the 10-nearest neighbor graph only, O(kn) instead of n^2 edge variables
+                obj, opt, solution = mip_tsp_lazy(points, time_threshold=remaining, dist=dist, initial_tour=solution,
+                                                  candidate_k=10, stop=lambda: bool(interrupted))
+        except DOcplexException:
+            pass
+        finally:
+            if handle_signal:
+                signal.signal(signal.SIGINT, previous_handler)
     
     # prepare the solution in the specified output format
     output_data = '%.2f' % obj + ' ' + str(opt) + '\n'
@@ -106,9 +283,9 @@ if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1:
         file_location = sys.argv[1].strip()
-        with open(file_location, 'r') as input_data_file:
-            input_data = input_data_file.read()
-        print(solve_it(input_data))
+        input_data = load_numbers(file_location)
+        time_budget = float(sys.argv[2]) if len(sys.argv) > 2 else TIME_BUDGET
+        print(solve_it(input_data, time_budget=time_budget))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/tsp_51_1)')
 
@@ -0,0 +1,168 @@
+import math
+import numpy as np
+
+
+def hilbert_order(xs, ys, order=16):
+    #indices of the points sorted by their position along a hilbert curve on a 2^order grid
+    side = 2**order
+    scale = max(np.ptp(xs), np.ptp(ys)) or 1.0
+    x = ((xs - xs.min()) / scale * (side - 1)).astype(np.int64)
+    y = ((ys - ys.min()) / scale * (side - 1)).astype(np.int64)
+    d = np.zeros(len(x), dtype=np.int64)
+    s = side // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        #rotate the quadrant so the curve stays continuous
+        flip = ~ry & rx
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s //= 2
+    return np.argsort(d, kind='stable')
+
+def kmeans(xs, ys, clusters, iterations=10):
+    #lloyd's algorithm started from equal chunks of the hilbert order, returns a label per point
+    chunks = np.array_split(hilbert_order(xs, ys), clusters)
+    cx = np.array([xs[chunk].mean() for chunk in chunks])
+    cy = np.array([ys[chunk].mean() for chunk in chunks])
+    for _ in range(iterations):
+        labels = np.empty(len(xs), dtype=np.int64)
+        step = max(1, 4000000 // clusters)
+        for start in range(0, len(xs), step):
+            d = (xs[start:start+step, None] - cx[None, :])**2 + (ys[start:start+step, None] - cy[None, :])**2
+            labels[start:start+step] = d.argmin(axis=1)
+        counts = np.bincount(labels, minlength=clusters)
+        nonempty = counts > 0
+        cx[nonempty] = (np.bincount(labels, weights=xs, minlength=clusters) / np.maximum(counts, 1))[nonempty]
+        cy[nonempty] = (np.bincount(labels, weights=ys, minlength=clusters) / np.maximum(counts, 1))[nonempty]
+    return labels
+
+
+class grid_index():
+    #uniform grid over the points with about points_per_cell points per cell
+    #supports deleting points, for nearest unvisited queries, and vectorized k-nearest lists
+
+    def __init__(self, xs, ys, points_per_cell=2):
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        self.x = self.xs.tolist()
+        self.y = self.ys.tolist()
+        self.n = n = len(self.x)
+        self.x_min, self.y_min = float(self.xs.min()), float(self.ys.min())
+        width = float(self.xs.max()) - self.x_min
+        height = float(self.ys.max()) - self.y_min
+        cells = max(1, n // points_per_cell)
+        if width > 0 and height > 0:
+            self.cell_size = math.sqrt(width * height / cells)
+        else:
+            self.cell_size = max(width, height) / cells or 1.0
+        self.nx = int(width / self.cell_size) + 1
+        self.ny = int(height / self.cell_size) + 1
+        cx = np.minimum(((self.xs - self.x_min) / self.cell_size).astype(np.int64), self.nx - 1)
+        cy = np.minimum(((self.ys - self.y_min) / self.cell_size).astype(np.int64), self.ny - 1)
+        self.cx = cx.tolist()
+        self.cy = cy.tolist()
+        self.cell = cx * self.ny + cy
+        #points sorted by cell, starts[c]..starts[c+1] indexes the points of cell c
+        self.order = np.argsort(self.cell, kind='stable')
+        self.starts = np.searchsorted(self.cell[self.order], np.arange(self.nx * self.ny + 1))
+        self.buckets = None
+
+    def init_buckets(self):
+        #mutable per-cell buckets used by remove and nearest
+        self.buckets = [self.order[self.starts[c]:self.starts[c+1]].tolist() for c in range(self.nx * self.ny)]
+        self.slot = [0] * self.n
+        for bucket in self.buckets:
+            for i, v in enumerate(bucket):
+                self.slot[v] = i
+        self.alive = np.ones(self.n, dtype=bool)
+        self.remaining = self.n
+
+    def remove(self, v):
+        bucket = self.buckets[self.cx[v] * self.ny + self.cy[v]]
+        last = bucket.pop()
+        if last != v:
+            bucket[self.slot[v]] = last
+            self.slot[last] = self.slot[v]
+        self.alive[v] = False
+        self.remaining -= 1
+
+    def nearest(self, v):
+        #nearest point still in the index to point v, scanning rings of cells around it
+        if self.remaining == 0:
+            return None
+        x, y = self.x[v], self.y[v]
+        cx, cy = self.cx[v], self.cy[v]
+        best, best_dist = None, math.inf
+        r = 0
+        while True:
+            for c in self.ring(cx, cy, r):
+                for u in self.buckets[c]:
+                    dx = self.x[u] - x
+                    dy = self.y[u] - y
+                    d = dx*dx + dy*dy
+                    if d < best_dist:
+                        best, best_dist = u, d
+            if best is not None and best_dist <= (r * self.cell_size)**2:
+                return best
+            r += 1
+            if r > max(self.nx, self.ny):
+                return best
+            if (2*r + 1)**2 > 4 * self.remaining + 16:
+                #few points left and scattered: one vectorized scan is cheaper than more rings
+                d = np.where(self.alive, (self.xs - x)**2 + (self.ys - y)**2, np.inf)
+                return int(d.argmin())
+
+    def ring(self, cx, cy, r):
+        #ids of the cells at chebyshev distance r from cell (cx, cy)
+        ny = self.ny
+        if r == 0:
+            return [cx * ny + cy]
+        cells = []
+        y_lo, y_hi = max(cy - r, 0), min(cy + r, ny - 1)
+        for i in range(max(cx - r, 0), min(cx + r, self.nx - 1) + 1):
+            if i == cx - r or i == cx + r:
+                cells.extend(range(i * ny + y_lo, i * ny + y_hi + 1))
+            else:
+                if cy - r >= 0:
+                    cells.append(i * ny + cy - r)
+                if cy + r < ny:
+                    cells.append(i * ny + cy + r)
+        return cells
+
+    def block(self, cx, cy, r):
+        #points of all cells within chebyshev distance r of cell (cx, cy)
+        ny = self.ny
+        y_lo, y_hi = max(cy - r, 0), min(cy + r, ny - 1)
+        parts = [self.order[self.starts[i * ny + y_lo]:self.starts[i * ny + y_hi + 1]]
+                 for i in range(max(cx - r, 0), min(cx + r, self.nx - 1) + 1)]
+        return np.concatenate(parts)
+
+    def k_nearest_lists(self, k):
+        #k nearest neighbors of every point, computed cell by cell
+        k = min(k, self.n - 1)
+        neighbors = [None] * self.n
+        for c in range(self.nx * self.ny):
+            members = self.order[self.starts[c]:self.starts[c+1]]
+            if len(members) == 0:
+                continue
+            cx, cy = divmod(c, self.ny)
+            r = 1
+            while True:
+                candidates = self.block(cx, cy, r)
+                if len(candidates) > k or len(candidates) == self.n:
+                    d = np.sqrt((self.xs[members, None] - self.xs[None, candidates])**2 +
+                                (self.ys[members, None] - self.ys[None, candidates])**2)
+                    d[members[:, None] == candidates[None, :]] = np.inf
+                    idx = np.argpartition(d, k - 1, axis=1)[:, :k]
+                    kth = np.take_along_axis(d, idx, axis=1)
+                    #exact once the k-th distance cannot reach beyond the scanned block
+                    if len(candidates) == self.n or kth.max() <= r * self.cell_size:
+                        break
+                r += 1
+            order = np.argsort(kth, axis=1)
+            for v, row in zip(members.tolist(), candidates[np.take_along_axis(idx, order, axis=1)].tolist()):
+                neighbors[v] = row
+        return neighbors
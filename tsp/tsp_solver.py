@@ -1,13 +1,103 @@
 import math
+import random
+from array import array
+from collections import deque
 from itertools import combinations
 from time import time
+import numpy as np
+from distance import distance_provider
+from spatial import grid_index, hilbert_order
+
+
+class array_tour():
+
+    def __init__(self, order):
+        #order[i] is the node at position i, pos[v] is the position of node v
+        self.n = len(order)
+        self.order = array('i', order)
+        self.pos = array('i', bytes(4 * self.n))
+        for i, v in enumerate(self.order):
+            self.pos[v] = i
+        self.order_view = np.frombuffer(self.order, dtype=np.intc)
+        self.pos_view = np.frombuffer(self.pos, dtype=np.intc)
+        #when a list, every reversal is recorded so that a sequence of moves can be undone
+        self.journal = None
+
+    def next(self, v):
+        i = self.pos[v] + 1
+        return self.order[i if i < self.n else 0]
+
+    def prev(self, v):
+        return self.order[self.pos[v] - 1]
+
+    def reverse(self, i, j):
+        #reverse positions i..j (possibly wrapping), or the complement if it is shorter
+        if self.journal is not None:
+            self.journal.append((i, j))
+        n = self.n
+        length = (j - i) % n + 1
+        if 2 * length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        if length > 64:
+            #long segments are reversed through numpy views of the same buffers
+            idx = np.arange(i, i + length)
+            if i + length > n:
+                idx %= n
+            self.order_view[idx] = self.order_view[idx[::-1]]
+            self.pos_view[self.order_view[idx]] = idx
+            return
+        order, pos = self.order, self.pos
+        if i + length <= n:
+            segment = order[i:i + length]
+            segment.reverse()
+            order[i:i + length] = segment
+            for k in range(i, i + length):
+                pos[order[k]] = k
+        else:
+            for _ in range(length // 2):
+                order[i], order[j] = order[j], order[i]
+                pos[order[i]] = i
+                pos[order[j]] = j
+                i = i + 1 if i + 1 < n else 0
+                j = j - 1 if j > 0 else n - 1
+
+    def undo(self):
+        #revert every reversal recorded since the journal was started
+        journal, self.journal = self.journal, None
+        for i, j in reversed(journal):
+            self.reverse(i, j)
+
+    def reverse_path(self, a, b):
+        #reverse the forward path from node a to node b
+        self.reverse(self.pos[a], self.pos[b])
+
+    def move_2opt(self, a, b, c, d):
+        #replace edges (a,b),(c,d) by (a,c),(b,d); b and d are both successors or both predecessors
+        if self.next(a) == b:
+            self.reverse_path(b, c)
+        else:
+            self.reverse_path(a, d)
+
+    def to_list(self, start=0):
+        i = self.pos[start]
+        return self.order[i:].tolist() + self.order[:i].tolist()
 
 
 class tsp_solver():
 
-    def __init__(self, solution, points):
+    def __init__(self, solution, points, dist=None, debug=False):
         self.threshold = 10**-4
+        #obj_val is updated incrementally by every applied move and replaced by the exact tour
+        #length every recompute_every moves so rounding errors cannot pile up; in debug mode
+        #the exact length is checked against the incremental one after every move
+        self.recompute_every = 1000
+        self.debug = debug
+        self.moves = 0
         self.points = points
+        #set from outside (e.g. a signal handler) to make the running search return early
+        self.stop = False
+        self.dist = dist if dist is not None else distance_provider(points)
         self.opt = 0
         if solution:
             self.cycle = solution + [0]
@@ -20,45 +110,146 @@ class tsp_solver():
         return math.sqrt((p1.x - p2.x)**2 + (p1.y - p2.y)**2)
 
     def is_valid_sln(self):
-        return len(set(self.cycle[:-1])) == len(self.points) == len(self.cycle[:-1])
+        #closed cycle through every node exactly once, O(n)
+        n = len(self.points)
+        cycle = self.cycle
+        if len(cycle) != n + 1 or cycle[0] != cycle[-1]:
+            return False
+        nodes = np.asarray(cycle)
+        if nodes.min() < 0 or nodes.max() >= n:
+            return False
+        counts = np.bincount(nodes, minlength=n)
+        counts[cycle[0]] -= 1
+        return bool((counts == 1).all())
 
     def edge_dist(self, v1, v2):
-        p1 = self.points[v1]
-        p2 = self.points[v2]
-        return self.point_dist(p1,p2)
+        return self.dist(v1, v2)
 
     def cycle_length(self):
-        return sum(self.edge_dist(v1, v2) for v1, v2 in zip(self.cycle[:-1], self.cycle[1:]))
-
-    def greedy(self):
-        cycle = [0]
-        candidates = set(self.cycle[1:-1])
-        while candidates:
-            curr_point = cycle[-1]
-            nearest_neighbor = None
-            nearest_dist = math.inf
-            for neighbor in candidates:
-                neighbor_dist = self.edge_dist(curr_point, neighbor)
-                if neighbor_dist < nearest_dist:
-                    nearest_neighbor = neighbor
-                    nearest_dist = neighbor_dist
-            cycle.append(nearest_neighbor)
-            candidates.remove(nearest_neighbor)
-        cycle.append(0)
-        self.cycle = cycle
+        return self.dist.tour_length(self.cycle)
+
+    def record_move(self, gain, order=None):
+        #book an applied move that shortened the tour by gain; order is the current tour
+        #(array_tour view or node array), None when self.cycle is up to date
+        self.obj_val -= gain
+        self.moves += 1
+        if self.debug or self.moves % self.recompute_every == 0:
+            self.recompute(order)
+
+    def recompute(self, order=None):
+        exact = self.cycle_length() if order is None else self.dist.order_length(order)
+        if self.debug:
+            assert abs(exact - self.obj_val) <= 1e-6 * max(1.0, exact), \
+                'incremental objective %f drifted from tour length %f' % (self.obj_val, exact)
+        self.obj_val = exact
+
+    def set_cycle(self, order):
+        #closed cycle starting and ending at node 0
+        i = order.index(0)
+        self.cycle = order[i:] + order[:i] + [0]
         self.obj_val = self.cycle_length()
+
+    def greedy(self, start=0):
+        if self.dist.matrix is None:
+            return self.greedy_grid(start)
+        cycle = [start]
+        visited = np.zeros(len(self.points), dtype=bool)
+        visited[start] = True
+        for _ in range(len(self.points) - 1):
+            #nearest unvisited node from one vectorized distance row
+            row = np.where(visited, np.inf, self.dist.row(cycle[-1]))
+            nearest_neighbor = int(row.argmin())
+            cycle.append(nearest_neighbor)
+            visited[nearest_neighbor] = True
+        self.set_cycle(cycle)
+        return self.obj_val, self.opt, self.cycle[:-1]
+
+    def greedy_grid(self, start=0):
+        #nearest neighbor tour with a grid index, for instances too large for a distance matrix
+        grid = grid_index(self.dist.xs, self.dist.ys)
+        grid.init_buckets()
+        cycle = [start]
+        grid.remove(start)
+        for _ in range(len(self.points) - 1):
+            nearest_neighbor = grid.nearest(cycle[-1])
+            cycle.append(nearest_neighbor)
+            grid.remove(nearest_neighbor)
+        self.set_cycle(cycle)
+        return self.obj_val, self.opt, self.cycle[:-1]
+
+    def space_filling_curve(self, order=16):
+        #visit the points in hilbert curve order on a 2^order x 2^order grid, O(n log n)
+        self.set_cycle(hilbert_order(self.dist.xs, self.dist.ys, order).tolist())
+        return self.obj_val, self.opt, self.cycle[:-1]
+
+    def greedy_edge(self, k=10):
+        #shortest-edge-first over the k-nearest candidate edges, with union-find to avoid subtours and
+        #degree <= 2; the resulting fragments are joined end to end by nearest free endpoint
+        n = len(self.points)
+        if n < 3:
+            self.set_cycle(list(range(n)))
+            return self.obj_val, self.opt, self.cycle[:-1]
+        neighbors = np.array(self.neighbor_lists(k), dtype=np.int64)
+        i = np.repeat(np.arange(n), neighbors.shape[1])
+        j = neighbors.ravel()
+        keys = np.unique(np.minimum(i, j) * n + np.maximum(i, j))
+        i, j = keys // n, keys % n
+        order = np.argsort(self.dist.lengths(i, j), kind='stable')
+        parent = list(range(n))
+        degree = [0] * n
+        adjacent = [[] for _ in range(n)]
+        for u, v in zip(i[order].tolist(), j[order].tolist()):
+            if degree[u] == 2 or degree[v] == 2:
+                continue
+            root_u = u
+            while parent[root_u] != root_u:
+                parent[root_u] = parent[parent[root_u]]
+                root_u = parent[root_u]
+            root_v = v
+            while parent[root_v] != root_v:
+                parent[root_v] = parent[parent[root_v]]
+                root_v = parent[root_v]
+            if root_u == root_v:
+                continue
+            parent[root_u] = root_v
+            degree[u] += 1
+            degree[v] += 1
+            adjacent[u].append(v)
+            adjacent[v].append(u)
+
+        #join the fragments: walk one fragment to its other end, continue at the nearest free endpoint
+        ends = [v for v in range(n) if degree[v] < 2]
+        slot = {v: e for e, v in enumerate(ends)}
+        grid = grid_index(self.dist.xs[ends], self.dist.ys[ends])
+        grid.init_buckets()
+        cycle = []
+        current = ends[0]
+        while True:
+            grid.remove(slot[current])
+            prev = None
+            while True:
+                cycle.append(current)
+                following = [v for v in adjacent[current] if v != prev]
+                if not following:
+                    break
+                prev, current = current, following[0]
+            if grid.alive[slot[current]]:
+                grid.remove(slot[current])
+            nearest = grid.nearest(slot[current])
+            if nearest is None:
+                break
+            current = ends[nearest]
+        self.set_cycle(cycle)
         return self.obj_val, self.opt, self.cycle[:-1]
 
     def swap(self, start, end):
         improved = False
-        new_cycle = self.cycle[:start] + self.cycle[start:end+1][::-1] + self.cycle[end+1:]
-        new_obj_val = self.obj_val - (self.edge_dist(self.cycle[start-1], self.cycle[start]) + 
-                                        self.edge_dist(self.cycle[end], self.cycle[end+1])) + \
-                                        (self.edge_dist(new_cycle[start-1], new_cycle[start]) + 
-                                        self.edge_dist(new_cycle[end], new_cycle[end+1]))
-        if new_obj_val < self.obj_val - self.threshold:
-            self.cycle = new_cycle
-            self.obj_val = new_obj_val
+        cycle = self.cycle
+        delta = self.edge_dist(cycle[start-1], cycle[end]) + self.edge_dist(cycle[start], cycle[end+1]) - \
+                (self.edge_dist(cycle[start-1], cycle[start]) + self.edge_dist(cycle[end], cycle[end+1]))
+        if delta < -self.threshold:
+            cycle[start:end+1] = cycle[end:start-1:-1]
+            self.record_move(-delta)
             improved = True
             return improved
 
@@ -66,7 +257,7 @@ class tsp_solver():
         improved = True
         t = time()
         while improved:
-            if time_threshold and time() - t >= time_threshold:
+            if self.stop or time_threshold and time() - t >= time_threshold:
                 break
             improved = False
             for start, end in combinations(range(1, len(self.cycle) - 1), 2):
@@ -75,3 +266,291 @@ class tsp_solver():
                     break
         return self.obj_val, self.opt, self.cycle[:-1]
 
+
+    def neighbor_lists(self, k=10):
+        return self.dist.neighbor_lists(k)
+
+    def two_opt_numpy_solver(self, time_threshold=None):
+        #best-improvement 2-opt where, for each position i, the gains of all j are computed at once
+        #from the tour coordinates with numpy; meant for small and medium instances (n < ~2000)
+        n = len(self.points)
+        if n < 5:
+            return self.two_opt_solver(time_threshold=time_threshold)
+        t = time()
+        tour = np.array(self.cycle[:-1])
+        #coordinates in tour order with the first node repeated at position n, so the successor of
+        #j is always j+1; reversals stay within 1..n-1 and never touch either copy of the first node
+        x, y = self.dist.xs[self.cycle], self.dist.ys[self.cycle]
+        #edge[j] is the length of the edge from position j to position j+1
+        edge = np.hypot(np.diff(x), np.diff(y))
+        improved = True
+        while improved and not self.stop:
+            improved = False
+            for i in range(n - 2):
+                if self.stop or time_threshold and time() - t >= time_threshold:
+                    break
+                #remove (i, i+1) and (j, j+1), add (i, j) and (i+1, j+1)
+                #j runs over i+2..n-1, except j = n-1 when i = 0 since then j+1 is i
+                end = n if i > 0 else n - 1
+                js, js_next = slice(i + 2, end), slice(i + 3, end + 1)
+                gain = edge[i] + edge[js] - np.hypot(x[js] - x[i], y[js] - y[i]) - \
+                    np.hypot(x[js_next] - x[i+1], y[js_next] - y[i+1])
+                if len(gain) == 0:
+                    continue
+                best = int(gain.argmax())
+                if gain[best] <= self.threshold:
+                    continue
+                j = i + 2 + best
+                tour[i+1:j+1] = tour[i+1:j+1][::-1].copy()
+                x[i+1:j+1] = x[i+1:j+1][::-1].copy()
+                y[i+1:j+1] = y[i+1:j+1][::-1].copy()
+                edge[i+1:j] = edge[i+1:j][::-1].copy()
+                edge[i] = math.hypot(x[i+1] - x[i], y[i+1] - y[i])
+                edge[j] = math.hypot(x[j+1] - x[j], y[j+1] - y[j])
+                self.record_move(float(gain[best]), tour)
+                improved = True
+        self.set_cycle(tour.tolist())
+        return self.obj_val, self.opt, self.cycle[:-1]
+
+    def load_tour(self):
+        return array_tour(self.cycle[:-1])
+
+    def store_tour(self, tour):
+        self.cycle = tour.to_list(0) + [0]
+        self.recompute()
+
+    def improve_2opt(self, tour, a, neighbors):
+        #apply the first improving 2-opt move that adds an edge from a to one of its neighbors
+        dist = self.dist
+        for succ in (tour.next, tour.prev):
+            b = succ(a)
+            d_ab = dist(a, b)
+            for c in neighbors[a]:
+                d_ac = dist(a, c)
+                if d_ac >= d_ab:
+                    break
+                d = succ(c)
+                if d == a or c == b:
+                    continue
+                delta = d_ab + dist(c, d) - d_ac - dist(b, d)
+                if delta > self.threshold:
+                    tour.move_2opt(a, b, c, d)
+                    self.record_move(delta, tour.order_view)
+                    return (a, b, c, d)
+        return None
+
+    def improve_or_opt(self, tour, a, neighbors, max_segment=3):
+        #move the segment of 1..max_segment nodes starting at a between a neighbor c of a and
+        #one of c's tour neighbors d, in either orientation
+        dist = self.dist
+        for succ, pred in ((tour.next, tour.prev), (tour.prev, tour.next)):
+            p = pred(a)
+            s2 = a
+            segment = [a]
+            for _ in range(max_segment):
+                nx = succ(s2)
+                if nx == p or len(segment) + 3 > tour.n:
+                    break
+                removed = dist(p, a) + dist(s2, nx) - dist(p, nx)
+                for c in neighbors[a]:
+                    d_ac = dist(a, c)
+                    if d_ac >= removed - self.threshold:
+                        break
+                    if c in segment or c == p or c == nx:
+                        continue
+                    for d in (succ(c), pred(c)):
+                        if d in segment or d == p or d == nx:
+                            continue
+                        delta = removed - (d_ac + dist(s2, d) - dist(c, d))
+                        if delta > self.threshold:
+                            self.move_segment(tour, p, a, s2, nx, c, d, succ)
+                            self.record_move(delta, tour.order_view)
+                            return (p, a, s2, nx, c, d)
+                s2 = nx
+                segment.append(s2)
+        return None
+
+    def lk_candidates(self, tour, t1, t2, gain, neighbors, removed, added):
+        #moves (t3, t4, lookahead) for the free end t2 that keep the partial gain positive, best first
+        dist = self.dist
+        side = tour.next if tour.next(t2) == t1 else tour.prev
+        candidates = []
+        for t3 in neighbors[t2]:
+            d_23 = dist(t2, t3)
+            if gain - d_23 <= 0:
+                break
+            t4 = side(t3)
+            if t3 == t1 or t4 == t2 or t4 == t1:
+                continue
+            if (min(t3, t4), max(t3, t4)) in added or (min(t2, t3), max(t2, t3)) in removed:
+                continue
+            candidates.append((t3, t4, dist(t3, t4) - d_23))
+        candidates.sort(key=lambda candidate: -candidate[2])
+        return candidates
+
+    def improve_lk(self, tour, a, neighbors, max_depth=10, breadth=5):
+        #lin-kernighan style chain of 2-opt moves that starts by removing an edge at a;
+        #the first step tries up to breadth alternatives, deeper steps follow the best lookahead
+        #while the partial gain stays positive, and the chain is rolled back to its best prefix
+        dist = self.dist
+        for t2 in (tour.next(a), tour.prev(a)):
+            t1 = a
+            removed = {(min(t1, t2), max(t1, t2))}
+            for t3, t4, score in self.lk_candidates(tour, t1, t2, dist(t1, t2), neighbors, removed, set())[:breadth]:
+                touched = self.lk_chain(tour, t1, t2, t3, t4, neighbors, max_depth)
+                if touched:
+                    return touched
+        return None
+
+    def lk_chain(self, tour, t1, t2, t3, t4, neighbors, max_depth):
+        dist = self.dist
+        gain = dist(t1, t2)
+        improvement = 0.0
+        best_improvement, best_depth = self.threshold, 0
+        moves = []
+        removed = {(min(t1, t2), max(t1, t2))}
+        added = set()
+        while True:
+            tour.move_2opt(t2, t1, t3, t4)
+            moves.append((t2, t1, t3, t4))
+            improvement += dist(t1, t2) + dist(t3, t4) - dist(t2, t3) - dist(t1, t4)
+            removed.add((min(t3, t4), max(t3, t4)))
+            added.add((min(t2, t3), max(t2, t3)))
+            gain += dist(t3, t4) - dist(t2, t3)
+            t2 = t4
+            if improvement > best_improvement:
+                best_improvement, best_depth = improvement, len(moves)
+            if len(moves) >= max_depth:
+                break
+            candidates = self.lk_candidates(tour, t1, t2, gain, neighbors, removed, added)
+            if not candidates:
+                break
+            t3, t4, _ = candidates[0]
+        for b, a, c, d in reversed(moves[best_depth:]):
+            tour.move_2opt(b, c, a, d)
+        if best_depth:
+            self.record_move(best_improvement, tour.order_view)
+            return {v for move in moves[:best_depth] for v in move}
+        return None
+
+    @staticmethod
+    def move_segment(tour, p, s1, s2, nx, c, d, succ):
+        #replace edges (p,s1),(s2,nx),(c,d) by (p,nx),(c,s1),(s2,d) as a sequence of 2-opt moves;
+        #s1..s2 runs along succ and (x,y) is the edge (c,d) ordered along succ
+        x, y = (c, d) if succ(c) == d else (d, c)
+        tour.move_2opt(p, s1, x, y)
+        tour.move_2opt(p, x, nx, s2)
+        if c == x:
+            tour.move_2opt(x, s2, s1, y)
+
+    def neighbor_search(self, moves, k=10, time_threshold=None, active=None):
+        #run the improving moves around each node until none applies, guided by don't-look bits;
+        #active limits the initial scan to the given nodes, the rest start with their bit set
+        t = time()
+        neighbors = self.neighbor_lists(k)
+        tour = self.load_tour()
+        if active is None:
+            dont_look = [False] * len(self.points)
+            queue = deque(tour.order)
+        else:
+            dont_look = [True] * len(self.points)
+            queue = deque(active)
+            for v in queue:
+                dont_look[v] = False
+        self.local_search(tour, moves, neighbors, queue, dont_look, t, time_threshold)
+        self.store_tour(tour)
+        return self.obj_val, self.opt, self.cycle[:-1]
+
+    def local_search(self, tour, moves, neighbors, queue, dont_look, t, time_threshold):
+        #don't-look bits: only nodes in the queue are scanned for improving moves,
+        #a node re-enters the queue when a move touches it; returns False when stopped early
+        while queue:
+            if self.stop or time_threshold and time() - t >= time_threshold:
+                return False
+            a = queue.popleft()
+            dont_look[a] = True
+            for move in moves:
+                touched = move(tour, a, neighbors)
+                if touched:
+                    for v in touched:
+                        if dont_look[v]:
+                            dont_look[v] = False
+                            queue.append(v)
+                    break
+        return True
+
+    def double_bridge(self, tour, rng, segment=50):
+        #double-bridge kick A B C D -> A C B D on a random stretch of at most segment nodes,
+        #done with three reversals; returns the six nodes whose edges changed
+        n = tour.n
+        span = min(segment, n // 2)
+        length_b = rng.randint(1, span - 1)
+        length_c = rng.randint(1, span - length_b)
+        i = rng.randrange(n)
+        a = tour.order[i]
+        b1 = tour.order[(i + 1) % n]
+        b2 = tour.order[(i + length_b) % n]
+        c1 = tour.order[(i + length_b + 1) % n]
+        c2 = tour.order[(i + length_b + length_c) % n]
+        d = tour.order[(i + length_b + length_c + 1) % n]
+        dist = self.dist
+        gain = dist(a, b1) + dist(b2, c1) + dist(c2, d) - dist(a, c1) - dist(c2, b1) - dist(b2, d)
+        tour.reverse((i + 1) % n, (i + length_b + length_c) % n)
+        tour.reverse((i + 1) % n, (i + length_c) % n)
+        tour.reverse((i + length_c + 1) % n, (i + length_b + length_c) % n)
+        self.record_move(gain, tour.order_view)
+        return (a, b1, b2, c1, c2, d)
+
+    def two_opt_neighbor_solver(self, k=10, time_threshold=None):
+        if len(self.points) < 5:
+            return self.two_opt_solver(time_threshold=time_threshold)
+        return self.neighbor_search([self.improve_2opt], k, time_threshold)
+
+    def or_opt_solver(self, k=10, time_threshold=None):
+        #2-opt plus or-opt segment insertion over the same candidate lists
+        if len(self.points) < 8:
+            return self.two_opt_solver(time_threshold=time_threshold)
+        return self.neighbor_search([self.improve_2opt, self.improve_or_opt], k, time_threshold)
+
+    def lk_solver(self, k=8, max_depth=10, time_threshold=None, active=None):
+        #variable-depth search plus or-opt moves over the same candidate lists
+        if len(self.points) < 8:
+            return self.two_opt_solver(time_threshold=time_threshold)
+        improve_lk = lambda tour, a, neighbors: self.improve_lk(tour, a, neighbors, max_depth)
+        return self.neighbor_search([improve_lk, self.improve_or_opt], k, time_threshold, active)
+
+    def ils_solver(self, k=8, max_depth=10, time_threshold=None, segment=50, seed=None, report=None, patience=1000):
+        #iterated local search: lk + or-opt to a local optimum, then repeated double-bridge kicks
+        #re-optimized from the kicked nodes only; a kick is kept only if the tour gets shorter
+        #report(obj_val, tour) is called after every improvement
+        #runs until time_threshold, or without one until patience kicks in a row fail
+        n = len(self.points)
+        if n < 8:
+            return self.two_opt_solver(time_threshold=time_threshold)
+        t = time()
+        rng = random.Random(seed)
+        neighbors = self.neighbor_lists(k)
+        improve_lk = lambda tour, a, neighbors: self.improve_lk(tour, a, neighbors, max_depth)
+        moves = [improve_lk, self.improve_or_opt]
+        tour = self.load_tour()
+        dont_look = [False] * n
+        finished = self.local_search(tour, moves, neighbors, deque(tour.order), dont_look, t, time_threshold)
+        failures = 0
+        while finished and (time_threshold or failures < patience):
+            obj_val = self.obj_val
+            tour.journal = []
+            kicked = self.double_bridge(tour, rng, segment)
+            for v in kicked:
+                dont_look[v] = False
+            finished = self.local_search(tour, moves, neighbors, deque(kicked), dont_look, t, time_threshold)
+            if finished and self.obj_val < obj_val - self.threshold:
+                failures = 0
+                tour.journal = None
+                if report:
+                    report(self.obj_val, tour)
+            else:
+                failures += 1
+                tour.undo()
+                self.obj_val = obj_val
+        self.store_tour(tour)
+        return self.obj_val, self.opt, self.cycle[:-1]
@@ -2,8 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import math
+import os
+import sys
 from collections import namedtuple
 from docplex.mp.model import Model
+#instances.py at the repository root is shared by all solvers
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from instances import vrp_instance, parse_numbers, load_numbers
 
 
 Customer = namedtuple("Customer", ['index', 'demand', 'x', 'y'])
@@ -106,18 +111,11 @@ def solve_it(input_data):
     # Modify this code to run your optimization algorithm
 
     # parse the input
-    lines = input_data.split('\n')
-
-    parts = lines[0].split()
-    customer_count = int(parts[0])
-    vehicle_count = int(parts[1])
-    vehicle_capacity = int(parts[2])
-    
-    customers = []
-    for i in range(1, customer_count+1):
-        line = lines[i]
-        parts = line.split()
-        customers.append(Customer(i-1, int(parts[0]), float(parts[1]), float(parts[2])))
+    instance = vrp_instance(parse_numbers(input_data))
+    customer_count = instance.customer_count
+    vehicle_count = instance.vehicle_count
+    vehicle_capacity = instance.vehicle_capacity
+    customers = instance.customers(Customer)
 
     # #the depot is always the first customer in the input
     depot = customers[0] 
@@ -176,8 +174,7 @@ if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1:
         file_location = sys.argv[1].strip()
-        with open(file_location, 'r') as input_data_file:
-            input_data = input_data_file.read()
+        input_data = load_numbers(file_location)
         print(solve_it(input_data))
     else:
 